@@ -7,9 +7,11 @@ Format large (640x240) pour meilleure vision latérale
 Version refactorisée utilisant les modules partagés hexapod/
 """
 
+import os
 import cv2
 import time
 import signal
+import socket
 import logging
 import threading
 import json
@@ -22,8 +24,11 @@ from hexapod import (
     KeyboardHandler,
     ObstacleDetector,
     FastCamera,
-    HTTP_PORT
+    HTTP_PORT,
+    encode_mjpeg_part,
+    FrameSlot
 )
+from hexapod.constants import OPENCV_NUM_THREADS, NAVIGATION_CPU_CORE
 
 # Configuration du logging
 logging.basicConfig(
@@ -46,8 +51,8 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
 class NavigationStreamHandler(BaseHTTPRequestHandler):
     """Handler HTTP pour streaming vidéo en temps réel avec interface de navigation"""
     
-    shared_frame = None
-    shared_lock = threading.Lock()
+    frames = FrameSlot()  # Partie MJPEG encodée une fois par frame
+    shared_lock = threading.Lock()  # Protège uniquement shared_stats
     shared_stats = {
         'fps': 0, 'obstacles': 0, 'danger': 'INIT', 
         'action': 'stop', 'state': 'INIT', 'paused': False
@@ -65,8 +70,8 @@ class NavigationStreamHandler(BaseHTTPRequestHandler):
         else:
             self.send_error(404)
     
-    def _send_html(self):
-        html = '''<!DOCTYPE html>
+    # Page d'accueil encodée une seule fois au chargement de la classe
+    HTML_PAGE = '''<!DOCTYPE html>
 <html><head>
 <title>Hexapode Navigation</title>
 <meta charset="utf-8">
@@ -114,14 +119,18 @@ Ctrl+C ou Q = Quitter
 <span style="background:#f00;margin-left:15px"></span>STOP - Danger
 </div>
 <div class="info">SSH: ssh -L 8080:localhost:8080 user@[IP] puis http://localhost:8080</div>
-</body></html>'''
-        
-        data = html.encode()
-        self.send_response(200)
-        self.send_header('Content-Type', 'text/html')
-        self.send_header('Content-Length', len(data))
-        self.end_headers()
-        self.wfile.write(data)
+</body></html>'''.encode()
+    
+    # Réponse HTTP complète (ligne de statut + en-têtes + page), envoyée en une écriture
+    HTML_RESPONSE = (
+        b'HTTP/1.1 200 OK\r\n'
+        b'Content-Type: text/html\r\n'
+        b'Content-Length: %d\r\n'
+        b'\r\n%s' % (len(HTML_PAGE), HTML_PAGE)
+    )
+    
+    def _send_html(self):
+        self.wfile.write(self.HTML_RESPONSE)
     
     def _send_status(self):
         with self.shared_lock:
@@ -139,18 +148,19 @@ Ctrl+C ou Q = Quitter
         self.send_header('Cache-Control', 'no-cache')
         self.end_headers()
         
+        # Envoi immédiat de chaque frame (pas de regroupement Nagle)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        
         try:
+            last_seq = 0
             while True:
-                with self.shared_lock:
-                    frame = self.shared_frame
-                
-                if frame is not None:
-                    _, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-                    self.wfile.write(b'--F\r\nContent-Type:image/jpeg\r\n\r\n')
-                    self.wfile.write(buf)
-                    self.wfile.write(b'\r\n')
+                # Dort jusqu'à la prochaine frame publiée; seule la plus récente est
+                # envoyée (les frames publiées pendant un envoi lent sont sautées)
+                seq, part = self.frames.wait(last_seq)
                 
-                time.sleep(0.05)  # ~20 FPS max affichage
+                if seq != last_seq and part is not None:
+                    self.wfile.write(part)
+                last_seq = seq
         except:
             pass
     
@@ -186,7 +196,7 @@ class AutonomousNavigator:
         self.quit_requested = False  # Demande de quitter
         
         # Gestion clavier (module partagé)
-        self.keyboard = KeyboardHandler()
+        self.keyboard = KeyboardHandler(threaded=True)
         
         # Composants (modules partagés)
         self.camera = FastCamera()  # Utilise les constantes du module
@@ -221,16 +231,20 @@ class AutonomousNavigator:
         """Démarre le serveur HTTP pour le streaming"""
         try:
             # Vérifier si le port est disponible
-            import socket
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             result = sock.connect_ex(('localhost', HTTP_PORT))
             sock.close()
             
             if result == 0:
                 logger.warning(f"Port {HTTP_PORT} déjà utilisé, tentative d'arrêt du processus existant...")
-                import os
                 os.system(f"pkill -f 'python.*{HTTP_PORT}'")
-                time.sleep(1)
+                
+                # Attendre la libération du port (délai croissant) au lieu d'une seconde fixe
+                for delay in (0.05, 0.1, 0.2, 0.4, 0.8):
+                    time.sleep(delay)
+                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+                        if probe.connect_ex(('localhost', HTTP_PORT)) != 0:
+                            break
             
             self.http_server = ThreadedHTTPServer(('0.0.0.0', HTTP_PORT), NavigationStreamHandler)
             self.http_server.daemon_threads = True
@@ -367,11 +381,34 @@ class AutonomousNavigator:
         
         return False
     
+    def _pin_to_core(self):
+        """Épingle le thread de navigation sur un cœur dédié (Linux uniquement)"""
+        if NAVIGATION_CPU_CORE is None:
+            return
+        try:
+            # pid 0 = thread appelant: les threads déjà lancés ne sont pas affectés
+            os.sched_setaffinity(0, {NAVIGATION_CPU_CORE})
+            logger.info(f"[OK] Navigation épinglée sur le cœur {NAVIGATION_CPU_CORE}")
+        except (AttributeError, OSError) as e:
+            logger.warning(f"Épinglage CPU impossible: {e}")
+    
     def run(self):
         """Boucle principale de navigation"""
         self.running = True
+        self._pin_to_core()
         self.start_time = time.time()
         last_log_time = time.time()
+        next_step_time = time.time()
+        action = None  # Dernière action décidée (None = aucune frame analysée)
+        
+        # Méthode moteur de chaque action, résolue une seule fois
+        motor_steps = {
+            'forward': self.motors.forward,
+            'slide_left': self.motors.slide_left,
+            'slide_right': self.motors.slide_right,
+            'pivot_left': self.motors.pivot_left,
+            'pivot_right': self.motors.pivot_right,
+        }
         
         logger.info("=" * 50)
         logger.info(" NAVIGATION AUTONOME PRÊTE")
@@ -385,8 +422,10 @@ class AutonomousNavigator:
                 if self._handle_keyboard():
                     break
                 
-                # Capturer frame
-                frame = self.camera.get_frame()
+                # Capturer frame: attendre une nouvelle frame, sans dépasser l'heure du prochain pas
+                # (tant qu'aucune action n'est décidée, attendre au moins 50 ms pour ne pas boucler à vide)
+                min_wait = 0.05 if action is None else 0.0
+                frame = self.camera.wait_new_frame(timeout=max(min_wait, next_step_time - time.time()))
                 
                 # Si en pause ou pas encore démarré
                 if self.paused:
@@ -405,8 +444,8 @@ class AutonomousNavigator:
                                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
                             status = "PAUSE"
                         
+                        NavigationStreamHandler.frames.publish(encode_mjpeg_part(display_frame, b'F'))
                         with NavigationStreamHandler.shared_lock:
-                            NavigationStreamHandler.shared_frame = display_frame
                             NavigationStreamHandler.shared_stats = {
                                 'fps': 0,
                                 'obstacles': 0,
@@ -416,63 +455,62 @@ class AutonomousNavigator:
                                 'paused': True
                             }
                     
+                    action = None  # À la reprise, attendre une nouvelle détection
                     time.sleep(0.1)
                     continue
                 
-                if frame is None:
-                    time.sleep(0.05)
+                if frame is not None:
+                    # Détecter obstacles (uniquement sur une frame nouvelle)
+                    obstacles, danger, position = self.detector.detect(frame)
+                    self.detection_count += 1
+                    
+                    # Décider action
+                    action = self._decide_action(danger, position, obstacles)
+                    
+                    # Dessiner les obstacles
+                    display_frame = self.detector.draw(frame.copy(), obstacles, danger, position)
+                    
+                    # Ajouter infos sur la frame
+                    elapsed = time.time() - self.start_time
+                    det_fps = self.detection_count / elapsed if elapsed > 0 else 0
+                    action_text = {
+                        'forward': 'AVANCE', 
+                        'slide_left': 'GAUCHE', 
+                        'slide_right': 'DROITE',
+                        'pivot_left': 'ROT.G',
+                        'pivot_right': 'ROT.D',
+                        'stop': 'STOP'
+                    }.get(action, action)
+                    status_text = f"{action_text} | {det_fps:.1f} det/s"
+                    cv2.putText(display_frame, status_text, (5, 15), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0), 1)
+                    
+                    # Mettre à jour le stream HTTP
+                    NavigationStreamHandler.frames.publish(encode_mjpeg_part(display_frame, b'F'))
+                    with NavigationStreamHandler.shared_lock:
+                        NavigationStreamHandler.shared_stats = {
+                            'fps': det_fps,
+                            'obstacles': len(obstacles),
+                            'danger': danger,
+                            'action': action,
+                            'state': self.current_state,
+                            'paused': self.paused
+                        }
+                elif action is None:
+                    # Pas encore de frame analysée: rien à exécuter
                     continue
+                # Sinon (pas de nouvelle frame avant l'heure du pas): même action que précédemment
                 
-                # Détecter obstacles
-                obstacles, danger, position = self.detector.detect(frame)
-                self.detection_count += 1
-                
-                # Décider action
-                action = self._decide_action(danger, position, obstacles)
-                
-                # Dessiner les obstacles
-                display_frame = self.detector.draw(frame.copy(), obstacles, danger, position)
-                
-                # Ajouter infos sur la frame
-                elapsed = time.time() - self.start_time
-                det_fps = self.detection_count / elapsed if elapsed > 0 else 0
-                action_text = {
-                    'forward': 'AVANCE', 
-                    'slide_left': 'GAUCHE', 
-                    'slide_right': 'DROITE',
-                    'pivot_left': 'ROT.G',
-                    'pivot_right': 'ROT.D',
-                    'stop': 'STOP'
-                }.get(action, action)
-                status_text = f"{action_text} | {det_fps:.1f} det/s"
-                cv2.putText(display_frame, status_text, (5, 15), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0), 1)
-                
-                # Mettre à jour le stream HTTP
-                with NavigationStreamHandler.shared_lock:
-                    NavigationStreamHandler.shared_frame = display_frame
-                    NavigationStreamHandler.shared_stats = {
-                        'fps': det_fps,
-                        'obstacles': len(obstacles),
-                        'danger': danger,
-                        'action': action,
-                        'state': self.current_state,
-                        'paused': self.paused
-                    }
+                # Respecter le délai entre deux pas (si la frame est arrivée en avance)
+                remaining = next_step_time - time.time()
+                if remaining > 0:
+                    time.sleep(remaining)
                 
                 # Exécuter action
-                if action == 'forward':
-                    self.motors.forward()
-                elif action == 'slide_left':
-                    self.motors.slide_left()
-                elif action == 'slide_right':
-                    self.motors.slide_right()
-                elif action == 'pivot_left':
-                    self.motors.pivot_left()
-                elif action == 'pivot_right':
-                    self.motors.pivot_right()
-                else:
-                    self.motors.stop()
+                motor_steps.get(action, self.motors.stop)()
+                
+                # Délai selon action avant le prochain pas
+                next_step_time = time.time() + self.motors.get_delay()
                 
                 # Log toutes les secondes
                 if time.time() - last_log_time >= 1.0:
@@ -489,15 +527,15 @@ class AutonomousNavigator:
                     if obstacles:
                         obs_info = " | " + ", ".join([f"{o['size']}{o['pos']}" for o in obstacles[:3]])
                     
+                    cam = self.camera.get_stats()
                     logger.info(
                         f"[{danger:4}] {action_symbols.get(action, action):12} | "
-                        f"{det_fps:.1f} det/s | {len(obstacles)} obs{obs_info}"
+                        f"{det_fps:.1f} det/s | {len(obstacles)} obs{obs_info} | "
+                        f"prod={cam['produced']} cons={cam['consumed']} "
+                        f"reused={cam['reused']} dec={cam['decode_ms']:.1f}ms"
                     )
                     last_log_time = time.time()
                 
-                # Délai selon action
-                time.sleep(self.motors.get_delay())
-                
         except KeyboardInterrupt:
             logger.info("\n Ctrl+C détecté - Arrêt...")
         finally:
@@ -557,6 +595,9 @@ def main():
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
+    # Pas de pool de threads OpenCV: la détection reste sur le cœur de navigation
+    cv2.setNumThreads(OPENCV_NUM_THREADS)
+    
     print()
     print("=" * 60)
     print("    HEXAPODE - NAVIGATION AUTONOME")
@@ -4,12 +4,14 @@ Hexapode - Contrôle manuel au clavier (ZQSD + AE) avec flux vidéo
 Version refactorisée utilisant les modules partagés
 """
 
+import os
 import cv2
 import time
 import threading
 import json
 import logging
 import signal
+import socket
 import numpy as np
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from socketserver import ThreadingMixIn
@@ -19,8 +21,11 @@ from hexapod import (
     MotorController,
     KeyboardHandler,
     FastCamera,
-    HTTP_PORT
+    HTTP_PORT,
+    encode_mjpeg_part,
+    FrameSlot
 )
+from hexapod.constants import STREAM_CPU_CORE
 
 # Configuration du logging
 logging.basicConfig(
@@ -43,8 +48,8 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
 class ManualStreamHandler(BaseHTTPRequestHandler):
     """Handler HTTP pour streaming vidéo en contrôle manuel"""
     
-    shared_frame = None
-    shared_lock = threading.Lock()
+    frames = FrameSlot()  # Partie MJPEG encodée une fois par frame
+    shared_lock = threading.Lock()  # Protège uniquement shared_stats
     shared_stats = {
         'fps': 0, 'action': 'stop', 'mode': 'manuel'
     }
@@ -61,8 +66,8 @@ class ManualStreamHandler(BaseHTTPRequestHandler):
         else:
             self.send_error(404)
     
-    def _send_html(self):
-        html = '''<!DOCTYPE html>
+    # Page d'accueil encodée une seule fois au chargement de la classe
+    HTML_PAGE = '''<!DOCTYPE html>
 <html><head>
 <title>Hexapode Contrôle Manuel</title>
 <meta charset="utf-8">
@@ -103,14 +108,18 @@ setInterval(u,200);
 <b>X</b> = Quitter
 </div>
 <div class="info">SSH: ssh -L 8080:localhost:8080 user@[IP] puis http://localhost:8080</div>
-</body></html>'''
-        
-        data = html.encode()
-        self.send_response(200)
-        self.send_header('Content-Type', 'text/html')
-        self.send_header('Content-Length', len(data))
-        self.end_headers()
-        self.wfile.write(data)
+</body></html>'''.encode()
+    
+    # Réponse HTTP complète (ligne de statut + en-têtes + page), envoyée en une écriture
+    HTML_RESPONSE = (
+        b'HTTP/1.1 200 OK\r\n'
+        b'Content-Type: text/html\r\n'
+        b'Content-Length: %d\r\n'
+        b'\r\n%s' % (len(HTML_PAGE), HTML_PAGE)
+    )
+    
+    def _send_html(self):
+        self.wfile.write(self.HTML_RESPONSE)
     
     def _send_status(self):
         with self.shared_lock:
@@ -128,18 +137,19 @@ setInterval(u,200);
         self.send_header('Cache-Control', 'no-cache')
         self.end_headers()
         
+        # Envoi immédiat de chaque frame (pas de regroupement Nagle)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        
         try:
+            last_seq = 0
             while True:
-                with self.shared_lock:
-                    frame = self.shared_frame
+                # Dort jusqu'à la prochaine frame publiée; seule la plus récente est
+                # envoyée (les frames publiées pendant un envoi lent sont sautées)
+                seq, part = self.frames.wait(last_seq)
                 
-                if frame is not None:
-                    _, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-                    self.wfile.write(b'--F\r\nContent-Type:image/jpeg\r\n\r\n')
-                    self.wfile.write(buf)
-                    self.wfile.write(b'\r\n')
-                
-                time.sleep(0.05)  # ~20 FPS max affichage
+                if seq != last_seq and part is not None:
+                    self.wfile.write(part)
+                last_seq = seq
         except:
             pass
     
@@ -152,12 +162,34 @@ def start_video_thread(camera):
     frame_count = 0
     start_time = time.time()
     
+    action_names = {
+        'forward': 'AVANCER',
+        'backward': 'RECULER', 
+        'slide_left': 'GAUCHE',
+        'slide_right': 'DROITE',
+        'pivot_left': 'ROT. GAUCHE',
+        'pivot_right': 'ROT. DROITE',
+        'stop': 'STOP'
+    }
+    
+    # Frames "caméra absente" déjà encodées, une par action affichée
+    black_parts = {}
+    
     def video_loop():
         nonlocal frame_count
+        
+        # Épingler le producteur vidéo sur son cœur (pid 0 = ce thread uniquement)
+        if STREAM_CPU_CORE is not None:
+            try:
+                os.sched_setaffinity(0, {STREAM_CPU_CORE})
+            except (AttributeError, OSError) as e:
+                logger.warning(f"Épinglage CPU impossible: {e}")
+        
         while True:
             try:
-                # Capturer frame vidéo
-                frame = camera.get_frame()
+                # Attendre la prochaine frame: cadence fixée par la caméra
+                # (None = aucune frame depuis 1 s: caméra considérée absente)
+                frame = camera.wait_new_frame(timeout=1.0)
                 
                 if frame is not None:
                     frame_count += 1
@@ -171,16 +203,6 @@ def start_video_thread(camera):
                     with ManualStreamHandler.shared_lock:
                         current_action = ManualStreamHandler.shared_stats.get('action', 'stop')
                     
-                    action_names = {
-                        'forward': 'AVANCER',
-                        'backward': 'RECULER', 
-                        'slide_left': 'GAUCHE',
-                        'slide_right': 'DROITE',
-                        'pivot_left': 'ROT. GAUCHE',
-                        'pivot_right': 'ROT. DROITE',
-                        'stop': 'STOP'
-                    }
-                    
                     status_text = f"{action_names.get(current_action, current_action)} | {fps:.1f} FPS"
                     cv2.putText(display_frame, status_text, (5, 15), 
                                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0), 1)
@@ -192,46 +214,35 @@ def start_video_thread(camera):
                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
                     
                     # Mettre à jour le stream HTTP
+                    ManualStreamHandler.frames.publish(encode_mjpeg_part(display_frame, b'F'))
                     with ManualStreamHandler.shared_lock:
-                        ManualStreamHandler.shared_frame = display_frame
                         ManualStreamHandler.shared_stats.update({
                             'fps': fps,
                             'mode': 'manuel'
                         })
                 else:
-                    # Créer une frame noire de test
-                    black_frame = np.zeros((240, 640, 3), dtype=np.uint8)
-                    
                     with ManualStreamHandler.shared_lock:
                         current_action = ManualStreamHandler.shared_stats.get('action', 'stop')
                     
-                    action_names = {
-                        'forward': 'AVANCER',
-                        'backward': 'RECULER', 
-                        'slide_left': 'GAUCHE',
-                        'slide_right': 'DROITE',
-                        'pivot_left': 'ROT. GAUCHE',
-                        'pivot_right': 'ROT. DROITE',
-                        'stop': 'STOP'
-                    }
-                    
-                    action_display = action_names.get(current_action, current_action)
-                    cv2.putText(black_frame, "CAMERA NON DISPONIBLE", (180, 100), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                    cv2.putText(black_frame, action_display, (250, 140), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+                    # Frame noire de test: dessinée et encodée une seule fois par action
+                    part = black_parts.get(current_action)
+                    if part is None:
+                        black_frame = np.zeros((240, 640, 3), dtype=np.uint8)
+                        action_display = action_names.get(current_action, current_action)
+                        cv2.putText(black_frame, "CAMERA NON DISPONIBLE", (180, 100), 
+                                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                        cv2.putText(black_frame, action_display, (250, 140), 
+                                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+                        part = black_parts[current_action] = encode_mjpeg_part(black_frame, b'F')
                     
                     # Mettre à jour le stream HTTP avec frame noire
+                    ManualStreamHandler.frames.publish(part)
                     with ManualStreamHandler.shared_lock:
-                        ManualStreamHandler.shared_frame = black_frame
                         ManualStreamHandler.shared_stats.update({
                             'fps': 0,
                             'mode': 'manuel (cam. off)'
                         })
                 
-                # Délai pour ne pas surcharger le CPU
-                time.sleep(0.05)  # ~20 FPS
-                
             except Exception as e:
                 logger.error(f"Erreur dans le thread vidéo: {e}")
                 time.sleep(0.1)
@@ -248,16 +259,20 @@ def start_http_server():
         logger.info(f"Tentative de démarrage du serveur HTTP sur port {HTTP_PORT}...")
         
         # Vérifier si le port est disponible
-        import socket
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         result = sock.connect_ex(('localhost', HTTP_PORT))
         sock.close()
         
         if result == 0:
             logger.warning(f"Port {HTTP_PORT} déjà utilisé, tentative d'arrêt du processus existant...")
-            import os
             os.system(f"pkill -f 'python.*{HTTP_PORT}'")
-            time.sleep(1)
+            
+            # Attendre la libération du port (délai croissant) au lieu d'une seconde fixe
+            for delay in (0.05, 0.1, 0.2, 0.4, 0.8):
+                time.sleep(delay)
+                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+                    if probe.connect_ex(('localhost', HTTP_PORT)) != 0:
+                        break
         
         http_server = ThreadedHTTPServer(('0.0.0.0', HTTP_PORT), ManualStreamHandler)
         http_server.daemon_threads = True
@@ -351,7 +366,7 @@ def main():
         return
     
     try:
-        keyboard = KeyboardHandler()
+        keyboard = KeyboardHandler(threaded=True)
         logger.info("✅ Clavier initialisé")
     except Exception as e:
         logger.error(f"❌ Erreur clavier: {e}")
@@ -415,10 +430,22 @@ def main():
         'stop': 'STOP'
     }
     
+    # Méthode moteur de chaque action, résolue une seule fois
+    motor_steps = {
+        'forward': motors.forward,
+        'backward': motors.backward,
+        'slide_left': motors.slide_left,
+        'slide_right': motors.slide_right,
+        'pivot_left': motors.pivot_left,
+        'pivot_right': motors.pivot_right,
+    }
+    
+    next_step_time = time.time()
+    
     try:
         while True:
-            # Lecture clavier (priorité maximale pour la réactivité)
-            key = keyboard.get_key()
+            # Lecture clavier: attente jusqu'au prochain pas, réveil immédiat sur touche
+            key = keyboard.wait_key(timeout=max(0.0, next_step_time - time.time()))
             
             if key:
                 key = key.lower()
@@ -442,26 +469,20 @@ def main():
                     
                     print(f"\r >> {action_names.get(current_mode, current_mode)}      ", end="")
             
+            # Touche reçue avant l'heure du prochain pas: on garde la cadence
+            if time.time() < next_step_time:
+                continue
+            
             # Exécuter l'action moteur (boucle optimisée)
             if current_mode == 'stop':
                 motors.stop()
-                time.sleep(0.05)  # Délai court pour stop
+                next_step_time = time.time() + 0.05  # Délai court pour stop
                 continue
-            elif current_mode == 'forward':
-                motors.forward()
-            elif current_mode == 'backward':
-                motors.backward()
-            elif current_mode == 'slide_left':
-                motors.slide_left()
-            elif current_mode == 'slide_right':
-                motors.slide_right()
-            elif current_mode == 'pivot_left':
-                motors.pivot_left()
-            elif current_mode == 'pivot_right':
-                motors.pivot_right()
+            
+            motor_steps[current_mode]()
             
             # Délai optimisé selon l'action (crucial pour la fluidité)
-            time.sleep(motors.get_delay())
+            next_step_time = time.time() + motors.get_delay()
     
     except KeyboardInterrupt:
         print("\n\nInterruption...")
@@ -9,7 +9,7 @@ from .motor_controller import MotorController
 from .keyboard_handler import KeyboardHandler
 from .obstacle_detector import ObstacleDetector
 from .camera import FastCamera
-from .http_server import StreamHandler, ThreadedHTTPServer, start_stream_server
+from .http_server import StreamHandler, ThreadedHTTPServer, start_stream_server, encode_mjpeg_part, FrameSlot
 
 __all__ = [
     'MotorController',
@@ -19,6 +19,8 @@ __all__ = [
     'StreamHandler',
     'ThreadedHTTPServer',
     'start_stream_server',
+    'encode_mjpeg_part',
+    'FrameSlot',
     'HTTP_PORT',
     'CAMERA_WIDTH',
     'CAMERA_HEIGHT',
@@ -13,7 +13,16 @@ import logging
 import cv2
 import numpy as np
 
-from .constants import CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS
+try:
+    from picamera2 import Picamera2
+    PICAMERA2_AVAILABLE = True
+except ImportError:
+    PICAMERA2_AVAILABLE = False
+
+from .constants import (
+    CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS, CAMERA_CODEC, CAMERA_BUFFER_COUNT,
+    CAMERA_MJPEG_BUFFER_SIZE
+)
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +30,8 @@ logger = logging.getLogger(__name__)
 class FastCamera:
     """
     Capture caméra optimisée pour Raspberry Pi.
-    Supporte libcamera-vid (préféré) et rpicam-jpeg (fallback).
+    Supporte libcamera-vid (préféré), picamera2 (fallback) et rpicam-jpeg
+    (dernier recours si picamera2 n'est pas installé).
     """
     
     def __init__(self, width=None, height=None, fps=None):
@@ -30,9 +40,19 @@ class FastCamera:
         self.fps = fps if fps is not None else CAMERA_FPS
         
         self.current_frame = None
+        self.current_yuv = None   # Frame brute YUV420 (flux libcamera-vid yuv420)
         self.frame_lock = threading.Lock()
+        self.frame_event = threading.Event()   # Signalé à chaque nouvelle frame
+        
+        # Métriques (réglage fps / buffers / délais)
+        self.frames_produced = 0     # Frames publiées par le thread de capture
+        self.frames_consumed = 0     # Appels à get_frame()
+        self.frames_reused = 0       # get_frame() ayant renvoyé une frame déjà lue
+        self.decode_ms = 0.0         # Temps de décodage/conversion (moyenne glissante)
+        self._last_consumed = 0
         self.running = False
         self.process = None
+        self.picam = None
         self.temp_dir = None
         
         logger.info(f"Init camera {self.width}x{self.height}@{self.fps}fps")
@@ -50,70 +70,172 @@ class FastCamera:
                 '--height', str(self.height),
                 '--framerate', str(self.fps),
                 '--timeout', '0',
-                '--codec', 'mjpeg',
-                '--quality', '60',
+                '--codec', CAMERA_CODEC,
                 '--nopreview',
                 '-o', '-'
             ]
+            if CAMERA_CODEC == 'mjpeg':
+                cmd[-3:-3] = ['--quality', '60']
             
             self.process = subprocess.Popen(
                 cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=10**6
             )
             
-            self.capture_thread = threading.Thread(target=self._read_mjpeg, daemon=True)
+            reader = self._read_yuv420 if CAMERA_CODEC == 'yuv420' else self._read_mjpeg
+            self.capture_thread = threading.Thread(target=reader, daemon=True)
             self.capture_thread.start()
-            logger.info("[OK] Camera (libcamera-vid)")
+            logger.info(f"[OK] Camera (libcamera-vid, {CAMERA_CODEC})")
             
         except Exception as e:
-            logger.warning(f"libcamera-vid échoué: {e}, fallback rpicam-jpeg")
+            logger.warning(f"libcamera-vid échoué: {e}, fallback picamera2")
             self._start_fallback()
     
     def _start_fallback(self):
-        """Démarre en mode fallback avec rpicam-jpeg"""
+        """Démarre en mode fallback avec picamera2 (ou rpicam-jpeg si absent)"""
+        if PICAMERA2_AVAILABLE:
+            try:
+                self.picam = Picamera2()
+                # "RGB888" de libcamera = pixels ordonnés B, G, R (format OpenCV)
+                config = self.picam.create_video_configuration(
+                    main={"size": (self.width, self.height), "format": "RGB888"},
+                    controls={"FrameRate": self.fps},
+                    buffer_count=CAMERA_BUFFER_COUNT
+                )
+                self.picam.configure(config)
+                self.picam.start()
+                
+                self.capture_thread = threading.Thread(target=self._read_picamera2, daemon=True)
+                self.capture_thread.start()
+                logger.info("[OK] Camera (picamera2)")
+                return
+            except Exception as e:
+                logger.warning(f"picamera2 échoué: {e}, fallback rpicam-jpeg")
+                self._close_picamera2()
+        
         self.temp_dir = tempfile.mkdtemp()
         self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
         self.capture_thread.start()
     
+    def _publish(self, frame=None, yuv=None):
+        """Publie une nouvelle frame (BGR, ou YUV420 brute) et réveille les consommateurs"""
+        # Frame partagée sans copie entre les consommateurs: lecture seule
+        if frame is not None:
+            frame.setflags(write=False)
+        with self.frame_lock:
+            self.current_frame = frame
+            self.current_yuv = yuv
+            self.frames_produced += 1
+        self.frame_event.set()
+    
+    def _record_decode(self, t0):
+        """Met à jour la moyenne glissante du temps de décodage (t0 = perf_counter)"""
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        self.decode_ms = 0.9 * self.decode_ms + 0.1 * elapsed_ms
+    
+    def _read_yuv420(self):
+        """
+        Lit le flux YUV420 (I420) brut de libcamera-vid.
+        Taille de frame fixe (w*h*3/2): ni recherche de marqueurs, ni décodage JPEG.
+        La conversion BGR n'est faite qu'à la demande, dans get_frame().
+        """
+        frame_shape = (self.height * 3 // 2, self.width)
+        
+        try:
+            while self.running and self.process:
+                yuv = np.empty(frame_shape, dtype=np.uint8)
+                view = memoryview(yuv).cast('B')
+                
+                n = self.process.stdout.readinto(view)
+                if n < len(view):
+                    break
+                
+                self._publish(yuv=yuv)
+        except:
+            pass
+        finally:
+            self.running = False
+    
     def _read_mjpeg(self):
         """Lit le flux MJPEG de libcamera-vid"""
-        buffer = b''
+        # Buffer préalloué rempli sur place: pas de concaténation de bytes
+        buffer = bytearray(CAMERA_MJPEG_BUFFER_SIZE)
+        view = memoryview(buffer)
         jpeg_start = b'\xff\xd8'
         jpeg_end = b'\xff\xd9'
         
+        wpos = 0          # Fin des données valides dans le buffer
+        start_idx = -1    # Début de la frame en cours (-1 = pas encore trouvé)
+        scan = 0          # Position de reprise de la recherche (pas de re-scan)
+        
         try:
             while self.running and self.process:
-                chunk = self.process.stdout.read(4096)
-                if not chunk:
-                    break
+                # Buffer plein sans frame complète: repartir de zéro
+                if wpos == len(buffer):
+                    wpos, start_idx, scan = 0, -1, 0
                 
-                buffer += chunk
+                n = self.process.stdout.readinto1(view[wpos:])
+                if not n:
+                    break
+                wpos += n
                 
-                start_idx = buffer.find(jpeg_start)
-                if start_idx != -1:
-                    end_idx = buffer.find(jpeg_end, start_idx)
-                    if end_idx != -1:
-                        jpeg_data = buffer[start_idx:end_idx + 2]
-                        buffer = buffer[end_idx + 2:]
-                        
-                        frame = cv2.imdecode(
-                            np.frombuffer(jpeg_data, dtype=np.uint8),
-                            cv2.IMREAD_COLOR
-                        )
-                        
-                        if frame is not None:
-                            with self.frame_lock:
-                                self.current_frame = frame
+                while True:
+                    if start_idx == -1:
+                        start_idx = buffer.find(jpeg_start, scan, wpos)
+                        if start_idx == -1:
+                            scan = max(0, wpos - 1)
+                            break
+                        scan = start_idx + 2
+                    
+                    end_idx = buffer.find(jpeg_end, scan, wpos)
+                    if end_idx == -1:
+                        scan = max(start_idx + 2, wpos - 1)
+                        break
+                    
+                    t0 = time.perf_counter()
+                    frame = cv2.imdecode(
+                        np.frombuffer(buffer, dtype=np.uint8,
+                                      count=end_idx + 2 - start_idx, offset=start_idx),
+                        cv2.IMREAD_COLOR
+                    )
+                    self._record_decode(t0)
+                    
+                    if frame is not None:
+                        self._publish(frame)
+                    
+                    # Ramener les octets restants en début de buffer
+                    rest = wpos - (end_idx + 2)
+                    buffer[:rest] = bytes(view[end_idx + 2:wpos])
+                    wpos, start_idx, scan = rest, -1, 0
+        except:
+            pass
+        finally:
+            self.running = False
+    
+    def _read_picamera2(self):
+        """Lit les frames de picamera2 directement en mémoire (ni processus, ni JPEG)"""
+        try:
+            while self.running and self.picam:
+                frame = self.picam.capture_array("main")
                 
-                # Limiter la taille du buffer
-                if len(buffer) > 500000:
-                    buffer = buffer[-100000:]
+                if frame is not None:
+                    self._publish(frame)
         except:
             pass
         finally:
             self.running = False
     
+    def _close_picamera2(self):
+        """Arrête et libère la caméra picamera2"""
+        if self.picam:
+            try:
+                self.picam.stop()
+                self.picam.close()
+            except:
+                pass
+            self.picam = None
+    
     def _capture_loop(self):
-        """Capture en mode fallback avec rpicam-jpeg"""
+        """Capture en dernier recours avec rpicam-jpeg"""
         frame_delay = 1.0 / self.fps
         frame_file = os.path.join(self.temp_dir, "frame.jpg")
         
@@ -128,14 +250,16 @@ class FastCamera:
                      '--quality', '60', 
                      '--output', frame_file, 
                      '--nopreview'],
-                    capture_output=True, timeout=2
+                    # Sortie jamais lue: pas de paire de pipes à créer et vider à chaque frame
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=2
                 )
                 
                 if os.path.exists(frame_file):
+                    t0 = time.perf_counter()
                     frame = cv2.imread(frame_file)
+                    self._record_decode(t0)
                     if frame is not None:
-                        with self.frame_lock:
-                            self.current_frame = frame
+                        self._publish(frame)
             except:
                 pass
             
@@ -144,9 +268,54 @@ class FastCamera:
                 time.sleep(frame_delay - elapsed)
     
     def get_frame(self):
-        """Retourne la dernière frame capturée"""
+        """
+        Retourne la dernière frame capturée (BGR), sans copie.
+        
+        La frame est partagée et en lecture seule: pour dessiner dessus,
+        faire frame.copy().
+        """
         with self.frame_lock:
-            return self.current_frame.copy() if self.current_frame is not None else None
+            # Flux YUV420: conversion BGR une seule fois par nouvelle frame
+            if self.current_frame is None and self.current_yuv is not None:
+                t0 = time.perf_counter()
+                frame = cv2.cvtColor(self.current_yuv, cv2.COLOR_YUV2BGR_I420)
+                frame.setflags(write=False)
+                self.current_frame = frame
+                self._record_decode(t0)
+            
+            if self.current_frame is None:
+                return None
+            
+            self.frames_consumed += 1
+            if self.frames_produced == self._last_consumed:
+                self.frames_reused += 1
+            self._last_consumed = self.frames_produced
+            return self.current_frame
+    
+    def wait_new_frame(self, timeout=None):
+        """
+        Attend l'arrivée d'une nouvelle frame puis la retourne.
+        
+        Args:
+            timeout: Attente maximale en secondes (None = infini)
+        
+        Returns:
+            La nouvelle frame (BGR, lecture seule), ou None si aucune frame
+            n'est arrivée avant le timeout (jamais une frame déjà lue)
+        """
+        if not self.frame_event.wait(timeout):
+            return None
+        self.frame_event.clear()
+        return self.get_frame()
+    
+    def get_stats(self):
+        """Retourne les compteurs de performance de la caméra"""
+        return {
+            'produced': self.frames_produced,
+            'consumed': self.frames_consumed,
+            'reused': self.frames_reused,
+            'decode_ms': self.decode_ms,
+        }
     
     def stop(self):
         """Arrête la capture caméra"""
@@ -156,6 +325,8 @@ class FastCamera:
             self.process.terminate()
             self.process = None
         
+        self._close_picamera2()
+        
         if self.temp_dir and os.path.exists(self.temp_dir):
             import shutil
             shutil.rmtree(self.temp_dir, ignore_errors=True)
@@ -8,6 +8,11 @@ Configuration des moteurs, ports et paramètres globaux
 # ============================================================================
 
 DEVICENAME = '/dev/ttyUSB0'
+
+# Débit du bus: doit correspondre au registre Baud Rate (adresse 8) de chaque
+# XL430 (3 = 1 Mbps, 4 = 2 Mbps, 5 = 3 Mbps, 6 = 4 Mbps). Passer à 2 Mbps
+# divise par deux la durée de chaque SyncWrite, mais les moteurs doivent
+# d'abord être reconfigurés (ex: Dynamixel Wizard), sinon plus aucune réponse
 BAUDRATE = 1000000
 PROTOCOL_VERSION = 2.0
 
@@ -20,6 +25,7 @@ DXL_IDS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
 
 # Adresses mémoire (XL430-W250)
 ADDR_TORQUE_ENABLE = 64
+LEN_TORQUE_ENABLE = 1
 ADDR_GOAL_POSITION = 116
 LEN_GOAL_POSITION = 4
 
@@ -37,6 +43,11 @@ FACTOR_TURN = 1.0     # Rotation
 
 HTTP_PORT = 8080
 
+# Flux MJPEG: qualité JPEG et facteur de réduction appliqué avant l'encodage
+# (2 = demi-résolution: ~4x moins de pixels à encoder et à transmettre)
+STREAM_JPEG_QUALITY = 70
+STREAM_DOWNSCALE = 1
+
 # ============================================================================
 # CONFIGURATION CAMÉRA
 # ============================================================================
@@ -45,18 +56,25 @@ CAMERA_WIDTH = 640
 CAMERA_HEIGHT = 240
 CAMERA_FPS = 10
 
+# Format de sortie de libcamera-vid: 'yuv420' (brut, sans décodage) ou 'mjpeg'
+# En yuv420, la largeur doit rester multiple de 64 (pas de padding de ligne)
+CAMERA_CODEC = 'yuv420'
+CAMERA_BUFFER_COUNT = 3   # Buffers libcamera alloués par picamera2 (>= 3)
+CAMERA_MJPEG_BUFFER_SIZE = 1 << 20   # Buffer de lecture du flux MJPEG (octets)
+
 # ============================================================================
 # CONFIGURATION DÉTECTION D'OBSTACLES
 # ============================================================================
 
-# Surface minimale pour détecter un obstacle (en pixels²)
+# Surface minimale pour détecter un obstacle (en pixels², surface englobée
+# par le contour externe: les trous d'un blob creux sont comptés)
 OBSTACLE_MIN_AREA = 4000
 
 # Zone de détection dans l'image (ratio de hauteur)
 OBSTACLE_ROI_TOP = 0.25      # Début de la ROI (25% du haut)
 OBSTACLE_ROI_BOTTOM = 0.95   # Fin de la ROI (95% du haut)
 
-# Seuil de détection de contours Canny
+# Seuil de détection de contours (gradient de Scharr)
 OBSTACLE_EDGE_THRESH = 60
 
 # Seuils de distance pour déclencher les alertes
@@ -66,5 +84,32 @@ OBSTACLE_DIST_THRESHOLD_STOP = 0.65    # Distance critique (STOP)
 
 # Seuils pour le traitement d'image
 OBSTACLE_SAT_THRESHOLD = 70    # Seuil de saturation
-OBSTACLE_LAP_THRESHOLD = 25    # Seuil Laplacien
+OBSTACLE_GRAD_FACTOR = 3       # Seuil gradient Scharr = OBSTACLE_EDGE_THRESH x facteur
+                               # (3 conserve les décisions Laplacien + Canny sur test_detection/)
 OBSTACLE_MIN_HEIGHT = 35       # Hauteur minimale d'un obstacle (pixels)
+
+# Facteur de réduction de la ROI avant traitement (1 = pleine résolution)
+# À 2, les structures fines (1-2 px) disparaissent: un obstacle central peut se
+# scinder en blobs latéraux (STOP CENTER -> WARN BOTH sur test_detection/)
+OBSTACLE_DOWNSCALE = 1
+
+# Traitement d'image sur GPU via OpenCL si disponible (repli CPU sinon).
+# Désactivé par défaut: non mesuré sur le Pi, active OpenCL pour tout le
+# processus, alloue des UMat à chaque frame (hors buffers préalloués) et
+# compile ses noyaux au premier appel, en pleine boucle de navigation.
+OBSTACLE_USE_OPENCL = False
+
+# ============================================================================
+# CONFIGURATION CPU (navigation autonome)
+# ============================================================================
+
+# Threads internes d'OpenCV (1 = pas de pool concurrent de la boucle moteurs)
+OPENCV_NUM_THREADS = 1
+
+# Cœur réservé à la boucle détection + moteurs (None = pas d'épinglage)
+# Les autres cœurs restent pour libcamera, la lecture caméra et le serveur HTTP
+NAVIGATION_CPU_CORE = 3
+
+# Cœur réservé au thread producteur du flux vidéo (capture -> dessin -> JPEG)
+# en contrôle manuel et dans start_stream_server (None = pas d'épinglage)
+STREAM_CPU_CORE = 2
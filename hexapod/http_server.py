@@ -3,14 +3,88 @@ Hexapode - Serveur HTTP pour le flux vidéo
 """
 
 import io
+import os
+import time
+import socket
 import logging
+import threading
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
 
 import cv2
 
+from .constants import STREAM_CPU_CORE, STREAM_JPEG_QUALITY, STREAM_DOWNSCALE
+
 logger = logging.getLogger(__name__)
 
+# Réponse /status constante, préparée une seule fois (statut + en-têtes + corps)
+STATUS_BODY = b'{"status": "running"}'
+STATUS_RESPONSE = (
+    b'HTTP/1.1 200 OK\r\n'
+    b'Content-type: application/json\r\n'
+    b'Content-Length: %d\r\n'
+    b'Access-Control-Allow-Origin: *\r\n'
+    b'\r\n%s' % (len(STATUS_BODY), STATUS_BODY)
+)
+
+
+def encode_mjpeg_part(frame, boundary=b'frame', quality=STREAM_JPEG_QUALITY,
+                      downscale=STREAM_DOWNSCALE):
+    """
+    Encode une frame en partie MJPEG complète (séparateur, en-têtes, JPEG).
+    
+    À appeler une seule fois par frame côté producteur: le résultat est
+    envoyé tel quel à chaque client, sans ré-encodage.
+    
+    Args:
+        downscale: Facteur de réduction avant encodage (1 = taille native)
+    
+    Returns:
+        bytes, ou None si l'encodage échoue
+    """
+    if downscale > 1:
+        h, w = frame.shape[:2]
+        frame = cv2.resize(frame, (w // downscale, h // downscale), interpolation=cv2.INTER_AREA)
+    ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        return None
+    return b'--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n%s\r\n' % (
+        boundary, jpeg.nbytes, jpeg
+    )
+
+
+class FrameSlot:
+    """
+    Dernière partie MJPEG publiée, partagée entre un producteur et N clients.
+    
+    La donnée est un bytes immuable publié par simple réaffectation (atomique
+    sous le GIL). Un numéro de séquence et une Condition permettent aux
+    clients de dormir jusqu'à la frame suivante au lieu de scruter.
+    """
+    
+    def __init__(self):
+        self.data = None
+        self.seq = 0
+        self._cond = threading.Condition()
+    
+    def publish(self, data):
+        """Publie une nouvelle partie et réveille les clients en attente"""
+        self.data = data
+        with self._cond:
+            self.seq += 1
+            self._cond.notify_all()
+    
+    def wait(self, last_seq, timeout=1.0):
+        """
+        Attend une frame plus récente que last_seq.
+        
+        Returns:
+            (seq, data) - seq == last_seq si le délai a expiré
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != last_seq, timeout)
+            return self.seq, self.data
+
 
 class StreamHandler(BaseHTTPRequestHandler):
     """Handler HTTP pour le streaming MJPEG"""
@@ -18,6 +92,10 @@ class StreamHandler(BaseHTTPRequestHandler):
     camera = None  # Sera défini avant le démarrage du serveur
     detector = None  # Optionnel: pour afficher les détections
     
+    frames = FrameSlot()  # Alimenté par produce_frames
+    
+    protocol_version = 'HTTP/1.1'  # Keep-alive pour les requêtes /status
+    
     def log_message(self, format, *args):
         """Désactive les logs HTTP standard"""
         pass
@@ -38,35 +116,23 @@ class StreamHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
         
+        # Envoi immédiat de chaque frame (pas de regroupement Nagle)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        
         try:
+            last_seq = 0
             while True:
-                frame = StreamHandler.camera.get_frame() if StreamHandler.camera else None
+                seq, part = StreamHandler.frames.wait(last_seq)
                 
-                if frame is not None:
-                    # Appliquer les détections si disponibles
-                    if StreamHandler.detector:
-                        obstacles, _, _ = StreamHandler.detector.detect(frame)
-                        frame = StreamHandler.detector.draw(frame, obstacles)
-                    
-                    # Encoder en JPEG
-                    _, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-                    data = jpeg.tobytes()
-                    
-                    self.wfile.write(b'--frame\r\n')
-                    self.wfile.write(b'Content-Type: image/jpeg\r\n')
-                    self.wfile.write(f'Content-Length: {len(data)}\r\n\r\n'.encode())
-                    self.wfile.write(data)
-                    self.wfile.write(b'\r\n')
+                if seq != last_seq and part is not None:
+                    self.wfile.write(part)
+                last_seq = seq
         except (BrokenPipeError, ConnectionResetError):
             pass
     
     def _handle_status(self):
         """Retourne le statut du serveur"""
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(b'{"status": "running"}')
+        self.wfile.write(STATUS_RESPONSE)
 
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
@@ -74,6 +140,36 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     daemon_threads = True
 
 
+def produce_frames(camera, detector=None):
+    """
+    Boucle productrice: lit la caméra, dessine les détections et encode
+    chaque nouvelle frame une seule fois pour tous les clients.
+    """
+    if STREAM_CPU_CORE is not None:
+        try:
+            # Cœur dédié: pas de migration ni de cache froid en plein encodage
+            os.sched_setaffinity(0, {STREAM_CPU_CORE})
+        except (AttributeError, OSError) as e:
+            logger.warning(f"Épinglage CPU impossible: {e}")
+    
+    while True:
+        try:
+            frame = camera.wait_new_frame(timeout=1.0)
+            if frame is None:
+                continue
+            
+            # Appliquer les détections si disponibles (sur une copie: frame partagée)
+            if detector:
+                frame = frame.copy()
+                obstacles, danger, position = detector.detect(frame)
+                detector.draw(frame, obstacles, danger, position)
+            
+            StreamHandler.frames.publish(encode_mjpeg_part(frame))
+        except Exception as e:
+            logger.error(f"Erreur producteur vidéo: {e}")
+            time.sleep(0.1)
+
+
 def start_stream_server(camera, detector=None, port=8080):
     """
     Démarre le serveur de streaming en arrière-plan.
@@ -86,11 +182,12 @@ def start_stream_server(camera, detector=None, port=8080):
     Returns:
         Instance du serveur
     """
-    import threading
-    
     StreamHandler.camera = camera
     StreamHandler.detector = detector
     
+    producer = threading.Thread(target=produce_frames, args=(camera, detector), daemon=True)
+    producer.start()
+    
     server = ThreadedHTTPServer(('0.0.0.0', port), StreamHandler)
     
     thread = threading.Thread(target=server.serve_forever, daemon=True)
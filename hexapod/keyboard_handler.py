@@ -3,10 +3,18 @@ Hexapode - Gestionnaire de clavier
 Gestion des entrées clavier en mode non-bloquant
 """
 
+import os
 import sys
+import codecs
+import queue
+import collections
 import select
 import termios
+import threading
 import tty
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class KeyboardHandler:
@@ -15,23 +23,88 @@ class KeyboardHandler:
     Permet de lire les touches sans bloquer l'exécution.
     """
     
-    def __init__(self):
+    def __init__(self, threaded=False):
+        """
+        Args:
+            threaded: Lire le clavier dans un thread dédié (get_key ne fait
+                      alors plus d'appel système dans la boucle moteurs)
+        """
         self.fd = sys.stdin.fileno()
         self.old_settings = termios.tcgetattr(self.fd)
         self._setup()
+        
+        # Touches déjà lues mais pas encore rendues (plusieurs par read possible)
+        self._pending = collections.deque()
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        
+        # Lecture en tâche de fond (optionnelle)
+        self._keys = None
+        self._reader = None
+        self._reader_running = False
+        if threaded:
+            self.start_reader()
     
     def _setup(self):
         """Configure le terminal en mode raw/cbreak"""
         tty.setcbreak(self.fd)
+        
+        # VMIN = VTIME = 0: read() rend la main tout de suite, même sans touche.
+        # Évite O_NONBLOCK, qui rendrait aussi stdout non-bloquant sur un tty
+        attrs = termios.tcgetattr(self.fd)
+        attrs[6][termios.VMIN] = 0
+        attrs[6][termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+    
+    def _read_keys(self):
+        """Lit les octets disponibles sur stdin (sans attendre) et met les touches en attente"""
+        # Lecture directe du descripteur: sys.stdin garderait en tampon les
+        # touches tapées rapidement, que select() ne signalerait plus
+        data = os.read(self.fd, 32)
+        if data:
+            self._pending.extend(self._decoder.decode(data))
+    
+    def start_reader(self):
+        """Lance le thread de lecture du clavier (touches mises en file)"""
+        if self._reader is not None:
+            return
+        self._keys = queue.SimpleQueue()
+        self._reader_running = True
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+    
+    def _read_loop(self):
+        """Thread de lecture: attend les touches et les place dans la file"""
+        while self._reader_running:
+            try:
+                # Timeout pour pouvoir s'arrêter proprement (restore)
+                ready, _, _ = select.select([self.fd], [], [], 0.2)
+                if ready:
+                    data = os.read(self.fd, 32)
+                    if not data:
+                        break  # stdin fermé
+                    for key in self._decoder.decode(data):
+                        self._keys.put(key)
+            except (OSError, ValueError) as e:
+                # stdin fermé ou descripteur invalide: arrêter plutôt que boucler
+                logger.warning(f"Lecture clavier interrompue: {e}")
+                break
+        self._reader_running = False
     
     def get_key(self):
         """
         Retourne la touche pressée ou None si aucune touche.
         Non-bloquant.
         """
-        if select.select([sys.stdin], [], [], 0) == ([sys.stdin], [], []):
-            return sys.stdin.read(1)
-        return None
+        if self._keys is not None:
+            try:
+                return self._keys.get_nowait()
+            except queue.Empty:
+                return None
+        
+        # Un seul appel système: read() non bloquant grâce à VMIN = 0
+        if not self._pending:
+            self._read_keys()
+        return self._pending.popleft() if self._pending else None
     
     def wait_key(self, timeout=None):
         """
@@ -43,16 +116,21 @@ class KeyboardHandler:
         Returns:
             La touche pressée ou None si timeout
         """
-        if timeout is None:
-            return sys.stdin.read(1)
+        if self._keys is not None:
+            try:
+                return self._keys.get(timeout=timeout)
+            except queue.Empty:
+                return None
         
-        ready, _, _ = select.select([sys.stdin], [], [], timeout)
-        if ready:
-            return sys.stdin.read(1)
-        return None
+        if not self._pending:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+            if ready:
+                self._read_keys()
+        return self._pending.popleft() if self._pending else None
     
     def restore(self):
         """Restaure les paramètres originaux du terminal"""
+        self._reader_running = False
         termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
     
     def __enter__(self):
@@ -6,6 +6,8 @@ Classe partagée pour le contrôle des 12 servomoteurs
 import time
 import logging
 
+import numpy as np
+
 try:
     from dynamixel_sdk import *
     DYNAMIXEL_AVAILABLE = True
@@ -15,7 +17,7 @@ except ImportError:
 
 from .constants import (
     DEVICENAME, BAUDRATE, PROTOCOL_VERSION, DXL_IDS,
-    ADDR_TORQUE_ENABLE, ADDR_GOAL_POSITION, LEN_GOAL_POSITION,
+    ADDR_TORQUE_ENABLE, LEN_TORQUE_ENABLE, ADDR_GOAL_POSITION, LEN_GOAL_POSITION,
     FACTOR_WALK, FACTOR_SLIDE, FACTOR_TURN
 )
 from .movements import (
@@ -26,6 +28,62 @@ from .movements import (
 logger = logging.getLogger(__name__)
 
 
+def goal_table(sequence):
+    """
+    Convertit une séquence (pas × moteurs, en degrés) en table de positions
+    Dynamixel bornées 0-4095, calculée une seule fois.
+    
+    Returns:
+        np.ndarray int16 de forme (nb_pas, nb_moteurs)
+    """
+    goals = [[deg2dxl(angle) for angle in step] for step in sequence]
+    return np.clip(goals, 0, 4095).astype(np.int16)
+
+
+def encode_goals(goals):
+    """
+    Encode une ligne de goal_table() en bloc de paramètres SyncWrite.
+    
+    Returns:
+        bytes: pour chaque moteur, son ID suivi des 4 octets little-endian
+        de la position (0-4095), prêts pour syncWriteTxOnly()
+    """
+    return b''.join(
+        bytes((motor_id,)) + goal_pos.to_bytes(LEN_GOAL_POSITION, 'little')
+        for motor_id, goal_pos in zip(DXL_IDS, goals.tolist())
+    )
+
+
+class _FrameRecorder:
+    """Faux port série: garde la trame construite par le SDK au lieu de l'envoyer"""
+    is_using = False
+    frame = None
+    
+    def clearPort(self):
+        pass
+    
+    def writePort(self, packet):
+        self.frame = bytes(packet)
+        return len(packet)
+
+
+def build_frame(params):
+    """
+    Construit la trame SyncWrite complète (en-tête, stuffing, CRC) d'un bloc
+    de paramètres encode_goals(), avec le SDK lui-même.
+    
+    Returns:
+        bytes prêts pour portHandler.writePort(), ou None sans dynamixel_sdk
+    """
+    if not DYNAMIXEL_AVAILABLE:
+        return None
+    recorder = _FrameRecorder()
+    PacketHandler(PROTOCOL_VERSION).syncWriteTxOnly(
+        recorder, ADDR_GOAL_POSITION, LEN_GOAL_POSITION, params, len(params)
+    )
+    return recorder.frame
+
+
 class MotorController:
     """
     Contrôleur de moteurs Dynamixel pour l'hexapode.
@@ -36,12 +94,22 @@ class MotorController:
         self.connected = False
         self.portHandler = None
         self.packetHandler = None
-        self.groupSyncWrite = None
+        self.groupSyncTorque = None
         
         # Index de pas pour les séquences
         self.step_index = 0
         self.current_action = 'stop'
         
+        # Position initiale pré-encodée: seule pose nécessaire à la connexion
+        self._dxl_init = goal_table([INIT_POSE])
+        self._pre_init = build_frame(encode_goals(self._dxl_init[0]))
+        
+        # Connexion en premier: les moteurs rejoignent la position initiale
+        # pendant le pré-calcul des séquences ci-dessous
+        settle_until = None
+        if auto_connect and DYNAMIXEL_AVAILABLE and self._connect():
+            settle_until = time.time() + 0.5
+        
         # Séquences pré-calculées avec facteurs d'amplitude
         self.seq_forward = amplify_sequence(SEQ_MOVE_F, FACTOR_WALK)
         self.seq_backward = amplify_sequence(SEQ_MOVE_B, FACTOR_WALK)
@@ -50,8 +118,27 @@ class MotorController:
         self.seq_pivot_left = amplify_sequence(SEQ_PIVOT_L, FACTOR_TURN)
         self.seq_pivot_right = amplify_sequence(SEQ_PIVOT_R, FACTOR_TURN)
         
-        if auto_connect and DYNAMIXEL_AVAILABLE:
-            self._connect()
+        # Positions Dynamixel quantifiées (int16) pour chaque pas
+        self._dxl_forward = goal_table(self.seq_forward)
+        self._dxl_backward = goal_table(self.seq_backward)
+        self._dxl_slide_left = goal_table(self.seq_slide_left)
+        self._dxl_slide_right = goal_table(self.seq_slide_right)
+        self._dxl_pivot_left = goal_table(self.seq_pivot_left)
+        self._dxl_pivot_right = goal_table(self.seq_pivot_right)
+        
+        # Trames SyncWrite complètes (CRC compris) pour chaque pas: un seul writePort par pas
+        self._pre_forward = [build_frame(encode_goals(row)) for row in self._dxl_forward]
+        self._pre_backward = [build_frame(encode_goals(row)) for row in self._dxl_backward]
+        self._pre_slide_left = [build_frame(encode_goals(row)) for row in self._dxl_slide_left]
+        self._pre_slide_right = [build_frame(encode_goals(row)) for row in self._dxl_slide_right]
+        self._pre_pivot_left = [build_frame(encode_goals(row)) for row in self._dxl_pivot_left]
+        self._pre_pivot_right = [build_frame(encode_goals(row)) for row in self._dxl_pivot_right]
+        
+        # Fin du temps de stabilisation en position initiale
+        if settle_until is not None:
+            remaining = settle_until - time.time()
+            if remaining > 0:
+                time.sleep(remaining)
     
     def _connect(self):
         """Établit la connexion avec les moteurs"""
@@ -67,23 +154,19 @@ class MotorController:
                 logger.error("Impossible de configurer le baudrate")
                 return False
             
-            self.groupSyncWrite = GroupSyncWrite(
+            self.groupSyncTorque = GroupSyncWrite(
                 self.portHandler, self.packetHandler,
-                ADDR_GOAL_POSITION, LEN_GOAL_POSITION
+                ADDR_TORQUE_ENABLE, LEN_TORQUE_ENABLE
             )
             
             # Activer le torque sur tous les moteurs
-            for mid in DXL_IDS:
-                self.packetHandler.write1ByteTxRx(
-                    self.portHandler, mid, ADDR_TORQUE_ENABLE, 1
-                )
+            self._set_torque(1)
             
             self.connected = True
             logger.info("[OK] Moteurs connectés")
             
-            # Position initiale
-            self._write_positions(INIT_POSE)
-            time.sleep(0.5)
+            # Position initiale (stabilisation attendue par l'appelant)
+            self._tx_precoded(self._pre_init)
             
             return True
             
@@ -92,44 +175,45 @@ class MotorController:
             self.connected = False
             return False
     
-    def _write_positions(self, angles):
-        """Envoie les positions à tous les moteurs simultanément"""
-        if not self.connected or self.groupSyncWrite is None:
-            return
+    def _set_torque(self, value):
+        """Active (1) ou désactive (0) le torque de tous les moteurs en un seul paquet"""
+        self.groupSyncTorque.clearParam()
         
-        self.groupSyncWrite.clearParam()
+        for motor_id in DXL_IDS:
+            self.groupSyncTorque.addParam(motor_id, [value])
         
-        for i, motor_id in enumerate(DXL_IDS):
-            goal_pos = deg2dxl(angles[i])
-            goal_pos = max(0, min(4095, goal_pos))
-            param = [
-                DXL_LOBYTE(DXL_LOWORD(goal_pos)),
-                DXL_HIBYTE(DXL_LOWORD(goal_pos)),
-                DXL_LOBYTE(DXL_HIWORD(goal_pos)),
-                DXL_HIBYTE(DXL_HIWORD(goal_pos))
-            ]
-            self.groupSyncWrite.addParam(motor_id, param)
+        self.groupSyncTorque.txPacket()
+    
+    def _tx_precoded(self, frame):
+        """
+        Envoie une trame SyncWrite déjà construite par build_frame().
+        
+        Équivaut à syncWriteTxOnly() sans reconstruire en-tête, stuffing et CRC.
+        """
+        if not self.connected or self.portHandler is None:
+            return
         
-        self.groupSyncWrite.txPacket()
+        self.portHandler.clearPort()
+        self.portHandler.writePort(frame)
     
     def stop(self):
         """Arrête le mouvement et retourne en position initiale"""
         if self.current_action != 'stop':
             self.current_action = 'stop'
             self.step_index = 0
-            self._write_positions(INIT_POSE)
+            self._tx_precoded(self._pre_init)
             logger.info("STOP STOP")
     
     def forward(self):
         """Effectue un pas en avant"""
         self.current_action = 'forward'
-        self._write_positions(self.seq_forward[self.step_index])
+        self._tx_precoded(self._pre_forward[self.step_index])
         self.step_index = (self.step_index + 1) % len(self.seq_forward)
     
     def backward(self):
         """Effectue un pas en arrière"""
         self.current_action = 'backward'
-        self._write_positions(self.seq_backward[self.step_index])
+        self._tx_precoded(self._pre_backward[self.step_index])
         self.step_index = (self.step_index + 1) % len(self.seq_backward)
     
     def slide_left(self):
@@ -137,7 +221,7 @@ class MotorController:
         if self.current_action != 'slide_left':
             self.step_index = 0
         self.current_action = 'slide_left'
-        self._write_positions(self.seq_slide_left[self.step_index])
+        self._tx_precoded(self._pre_slide_left[self.step_index])
         self.step_index = (self.step_index + 1) % len(self.seq_slide_left)
     
     def slide_right(self):
@@ -145,7 +229,7 @@ class MotorController:
         if self.current_action != 'slide_right':
             self.step_index = 0
         self.current_action = 'slide_right'
-        self._write_positions(self.seq_slide_right[self.step_index])
+        self._tx_precoded(self._pre_slide_right[self.step_index])
         self.step_index = (self.step_index + 1) % len(self.seq_slide_right)
     
     def pivot_left(self):
@@ -153,7 +237,7 @@ class MotorController:
         if self.current_action != 'pivot_left':
             self.step_index = 0
         self.current_action = 'pivot_left'
-        self._write_positions(self.seq_pivot_left[self.step_index])
+        self._tx_precoded(self._pre_pivot_left[self.step_index])
         self.step_index = (self.step_index + 1) % len(self.seq_pivot_left)
     
     def pivot_right(self):
@@ -161,7 +245,7 @@ class MotorController:
         if self.current_action != 'pivot_right':
             self.step_index = 0
         self.current_action = 'pivot_right'
-        self._write_positions(self.seq_pivot_right[self.step_index])
+        self._tx_precoded(self._pre_pivot_right[self.step_index])
         self.step_index = (self.step_index + 1) % len(self.seq_pivot_right)
     
     def get_delay(self):
@@ -185,14 +269,11 @@ class MotorController:
     def disconnect(self):
         """Déconnecte les moteurs proprement"""
         if self.connected:
-            self._write_positions(INIT_POSE)
+            self._tx_precoded(self._pre_init)
             time.sleep(0.3)
             
             # Désactiver le torque
-            for mid in DXL_IDS:
-                self.packetHandler.write1ByteTxRx(
-                    self.portHandler, mid, ADDR_TORQUE_ENABLE, 0
-                )
+            self._set_torque(0)
             
             self.portHandler.closePort()
             self.connected = False
@@ -3,6 +3,8 @@ Hexapode - Séquences de mouvement
 Toutes les séquences de positions pour les différents mouvements
 """
 
+import numpy as np
+
 # ============================================================================
 # POSITION INITIALE (REPOS)
 # ============================================================================
@@ -108,15 +110,6 @@ def amplify_sequence(sequence, factor):
     Amplifie une séquence de mouvement par un facteur donné.
     Augmente l'amplitude des mouvements autour de la position moyenne.
     """
-    new_sequence = []
-    num_motors = len(sequence[0])
-    means = [sum(step[i] for step in sequence) / len(sequence) for i in range(num_motors)]
-    
-    for step in sequence:
-        new_step = []
-        for i in range(num_motors):
-            delta = step[i] - means[i]
-            new_val = means[i] + (delta * factor)
-            new_step.append(new_val)
-        new_sequence.append(new_step)
-    return new_sequence
+    steps = np.asarray(sequence, dtype=np.float64)
+    means = steps.mean(axis=0)
+    return (means + (steps - means) * factor).tolist()
@@ -15,10 +15,20 @@ from .constants import (
     OBSTACLE_DIST_THRESHOLD_CENTER,
     OBSTACLE_DIST_THRESHOLD_STOP,
     OBSTACLE_SAT_THRESHOLD,
-    OBSTACLE_LAP_THRESHOLD,
-    OBSTACLE_MIN_HEIGHT
+    OBSTACLE_GRAD_FACTOR,
+    OBSTACLE_MIN_HEIGHT,
+    OBSTACLE_DOWNSCALE,
+    OBSTACLE_USE_OPENCL
 )
 
+# Couleurs (BGR) d'affichage selon le niveau de danger
+DANGER_COLORS = {
+    "OK": (0, 255, 0),
+    "OBS": (0, 220, 220),
+    "WARN": (0, 140, 255),
+    "STOP": (0, 0, 255)
+}
+
 
 class ObstacleDetector:
     """
@@ -26,14 +36,59 @@ class ObstacleDetector:
     Utilise plusieurs méthodes combinées pour détecter les gros obstacles.
     """
     
-    def __init__(self, min_area=None, roi_top=None, roi_bottom=None, edge_thresh=None):
+    def __init__(self, min_area=None, roi_top=None, roi_bottom=None, edge_thresh=None,
+                 downscale=None, use_opencl=None):
         # Utiliser les valeurs par défaut des constantes si non spécifiées
         self.min_area = min_area if min_area is not None else OBSTACLE_MIN_AREA
         self.roi_top = roi_top if roi_top is not None else OBSTACLE_ROI_TOP
         self.roi_bottom = roi_bottom if roi_bottom is not None else OBSTACLE_ROI_BOTTOM
         self.edge_thresh = edge_thresh if edge_thresh is not None else OBSTACLE_EDGE_THRESH
+        self._grad_thresh = min(254, self.edge_thresh * OBSTACLE_GRAD_FACTOR)
+        self.downscale = max(1, int(downscale if downscale is not None else OBSTACLE_DOWNSCALE))
+        
+        # OpenCL (GPU) seulement si demandé ET disponible à l'exécution
+        use_opencl = use_opencl if use_opencl is not None else OBSTACLE_USE_OPENCL
+        self.use_opencl = bool(use_opencl) and cv2.ocl.haveOpenCL()
+        if self.use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+            self.use_opencl = cv2.ocl.useOpenCL()
         
+        # Noyaux adaptés à la résolution de travail (ROI réduite)
+        s = self.downscale
+        blur = max(3, (9 // s) | 1)
+        self._blur_size = (blur, blur)
+        self._kernel_large = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, 7 // s), max(3, 7 // s)))
         self._kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        
+        # Marge autour de la zone active: couvre l'extension maximale de la
+        # fermeture + ouverture + dilatation (les résultats restent identiques)
+        self._margin = self._kernel_large.shape[0] + 2 * self._kernel.shape[0]
+        self._no_blobs = np.empty((0, 5), dtype=np.int32)
+        
+        # Buffers de travail réutilisés d'une frame à l'autre (voir _alloc_buffers)
+        self._roi_size = None
+        
+        # Géométrie des éléments fixes de draw(), voir _build_overlay
+        self._overlay_size = None
+    
+    def _alloc_buffers(self, shape):
+        """
+        (Ré)alloue les buffers intermédiaires pour une ROI réduite de taille (h, w).
+        Ne fait rien si la taille n'a pas changé: aucune allocation par frame.
+        """
+        rh, rw = shape
+        if self._roi_size == (rw, rh):
+            return
+        
+        self._roi_size = (rw, rh)
+        self._small = np.empty((rh, rw, 3), dtype=np.uint8)
+        self._hsv = np.empty((rh, rw, 3), dtype=np.uint8)
+        self._gray = np.empty((rh, rw), dtype=np.uint8)
+        self._sat = np.empty((rh, rw), dtype=np.uint8)
+        self._grad16 = np.empty((rh, rw), dtype=np.int16)
+        self._grad_x = np.empty((rh, rw), dtype=np.uint8)
+        self._grad_y = np.empty((rh, rw), dtype=np.uint8)
+        self._combined = np.empty((rh, rw), dtype=np.uint8)
     
     def detect(self, frame):
         """
@@ -55,96 +110,60 @@ class ObstacleDetector:
         y2 = int(h * self.roi_bottom)
         roi = frame[y1:y2, :]
         
-        # Conversion en différents espaces couleur
-        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-        hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-        
-        # Canal de saturation (objets colorés)
-        saturation = hsv[:, :, 1]
-        
-        # Flou pour réduire le bruit
-        blurred_gray = cv2.GaussianBlur(gray, (9, 9), 0)
-        blurred_sat = cv2.GaussianBlur(saturation, (9, 9), 0)
+        s = self.downscale
+        if self.use_opencl:
+            combined = self._compute_mask_opencl(roi)
+        else:
+            combined = self._compute_mask(roi)
         
-        # Méthode 1: Seuillage sur saturation
-        _, sat_thresh = cv2.threshold(blurred_sat, OBSTACLE_SAT_THRESHOLD, 255, cv2.THRESH_BINARY)
+        blobs = self._find_blobs(combined)
         
-        # Méthode 2: Laplacien (contraste local)
-        laplacian = cv2.Laplacian(blurred_gray, cv2.CV_64F)
-        laplacian = np.uint8(np.absolute(laplacian))
-        _, lap_thresh = cv2.threshold(laplacian, OBSTACLE_LAP_THRESHOLD, 255, cv2.THRESH_BINARY)
+        third_w = w // 3
         
-        # Méthode 3: Canny
-        edges = cv2.Canny(blurred_gray, self.edge_thresh, self.edge_thresh * 2)
+        # Stats ramenées à la résolution d'origine (int32, une ligne par composant)
+        xs = blobs[:, cv2.CC_STAT_LEFT] * s
+        ys = blobs[:, cv2.CC_STAT_TOP] * s
+        bws = blobs[:, cv2.CC_STAT_WIDTH] * s
+        bhs = blobs[:, cv2.CC_STAT_HEIGHT] * s
+        areas = blobs[:, cv2.CC_STAT_AREA] * (s * s)
         
-        # Combiner les méthodes
-        combined = cv2.bitwise_or(sat_thresh, lap_thresh)
-        combined = cv2.bitwise_or(combined, edges)
+        # Filtres: surface minimale, formes trop plates, hauteur minimale
+        valid = ((areas >= self.min_area)
+                 & (bws <= 8 * np.maximum(bhs, 1))
+                 & (bhs >= OBSTACLE_MIN_HEIGHT))
+        xs, ys, bws, bhs, areas = xs[valid], ys[valid], bws[valid], bhs[valid], areas[valid]
         
-        # Morphologie
-        kernel_large = cv2.getStructuringElement(cv2.MORPH_RECT, (7, 7))
-        kernel_medium = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        cx = xs + bws // 2
         
-        combined = cv2.morphologyEx(combined, cv2.MORPH_CLOSE, kernel_large)
-        combined = cv2.morphologyEx(combined, cv2.MORPH_OPEN, kernel_medium)
-        combined = cv2.dilate(combined, kernel_medium, iterations=1)
+        # Distance (bas de l'objet)
+        dists = (ys + bhs) / (y2 - y1)
         
-        contours, _ = cv2.findContours(combined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Position (Gauche/Centre/Droite)
+        left = cx < third_w
+        right = cx > 2 * third_w
+        center = ~(left | right)
         
-        obstacles = []
-        third_w = w // 3
+        has_left = bool((left & (dists > OBSTACLE_DIST_THRESHOLD_SIDE)).any())
+        has_right = bool((right & (dists > OBSTACLE_DIST_THRESHOLD_SIDE)).any())
+        center_close = center & (dists > OBSTACLE_DIST_THRESHOLD_CENTER)
+        has_center = bool(center_close.any())
+        closest_center_dist = float(dists[center_close].max()) if has_center else 0
         
-        has_left = False
-        has_right = False
-        has_center = False
-        closest_center_dist = 0
+        positions = np.where(left, "G", np.where(right, "D", "C"))
+        sizes = np.where(areas < 5000, "S", np.where(areas < 15000, "M", "L"))
         
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            if area < self.min_area:
-                continue
-            
-            x, y, bw, bh = cv2.boundingRect(cnt)
-            
-            # Filtrer formes trop plates
-            aspect_ratio = bw / max(bh, 1)
-            if aspect_ratio > 8:
-                continue
-            
-            # Hauteur minimale
-            if bh < OBSTACLE_MIN_HEIGHT:
-                continue
-            
-            y_global = y + y1
-            cx = x + bw // 2
-            
-            # Distance (bas de l'objet)
-            dist = (y + bh) / (y2 - y1)
-            
-            # Position (Gauche/Centre/Droite)
-            if cx < third_w:
-                pos = "G"
-                if dist > OBSTACLE_DIST_THRESHOLD_SIDE:
-                    has_left = True
-            elif cx > 2 * third_w:
-                pos = "D"
-                if dist > OBSTACLE_DIST_THRESHOLD_SIDE:
-                    has_right = True
-            else:
-                pos = "C"
-                if dist > OBSTACLE_DIST_THRESHOLD_CENTER:
-                    has_center = True
-                    closest_center_dist = max(closest_center_dist, dist)
-            
-            # Taille
-            size = "S" if area < 5000 else ("M" if area < 15000 else "L")
-            
-            obstacles.append({
-                'bbox': (x, y_global, bw, bh),
+        obstacles = [
+            {
+                'bbox': (x, y + y1, bw, bh),
                 'pos': pos,
                 'dist': dist,
                 'size': size
-            })
+            }
+            for x, y, bw, bh, pos, dist, size in zip(
+                xs.tolist(), ys.tolist(), bws.tolist(), bhs.tolist(),
+                positions.tolist(), dists.tolist(), sizes.tolist()
+            )
+        ]
         
         # Déterminer niveau de danger
         if has_center and closest_center_dist > OBSTACLE_DIST_THRESHOLD_STOP:
@@ -168,39 +187,156 @@ class ObstacleDetector:
         
         return obstacles, danger, position
     
+    def _compute_mask(self, roi):
+        """Calcule le masque binaire des zones suspectes de la ROI (CPU)"""
+        # Réduction de la ROI: ~s² fois moins de pixels à traiter
+        s = self.downscale
+        rh, rw = roi.shape[:2]
+        self._alloc_buffers((rh // s, rw // s))
+        if s > 1:
+            roi = cv2.resize(roi, self._roi_size, dst=self._small, interpolation=cv2.INTER_AREA)
+        
+        # Conversion en différents espaces couleur
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV, dst=self._hsv)
+        
+        # Canal de saturation (objets colorés)
+        saturation = cv2.extractChannel(hsv, 1, dst=self._sat)
+        
+        # Flou pour réduire le bruit (en place)
+        blurred_gray = cv2.GaussianBlur(gray, self._blur_size, 0, dst=gray)
+        blurred_sat = cv2.GaussianBlur(saturation, self._blur_size, 0, dst=saturation)
+        
+        # Méthode 1: Seuillage sur saturation
+        _, sat_thresh = cv2.threshold(blurred_sat, OBSTACLE_SAT_THRESHOLD, 255, cv2.THRESH_BINARY,
+                                      dst=blurred_sat)
+        
+        # Méthode 2: gradient de Scharr (contraste local + contours en une passe)
+        grad_x = cv2.convertScaleAbs(cv2.Scharr(blurred_gray, cv2.CV_16S, 1, 0, dst=self._grad16),
+                                     dst=self._grad_x)
+        grad_y = cv2.convertScaleAbs(cv2.Scharr(blurred_gray, cv2.CV_16S, 0, 1, dst=self._grad16),
+                                     dst=self._grad_y)
+        gradient = cv2.addWeighted(grad_x, 0.5, grad_y, 0.5, 0, dst=grad_x)
+        _, grad_thresh = cv2.threshold(gradient, self._grad_thresh, 255, cv2.THRESH_BINARY,
+                                       dst=gradient)
+        
+        # Combiner les méthodes
+        combined = cv2.bitwise_or(sat_thresh, grad_thresh, dst=self._combined)
+        return combined
+    
+    def _compute_mask_opencl(self, roi):
+        """
+        Même traitement que _compute_mask, exécuté sur le GPU via OpenCL (T-API).
+        Seul le masque final est rapatrié en mémoire CPU.
+        """
+        s = self.downscale
+        rh, rw = roi.shape[:2]
+        u_roi = cv2.UMat(roi)
+        if s > 1:
+            u_roi = cv2.resize(u_roi, (rw // s, rh // s), interpolation=cv2.INTER_AREA)
+        
+        u_gray = cv2.cvtColor(u_roi, cv2.COLOR_BGR2GRAY)
+        u_sat = cv2.extractChannel(cv2.cvtColor(u_roi, cv2.COLOR_BGR2HSV), 1)
+        
+        u_gray = cv2.GaussianBlur(u_gray, self._blur_size, 0)
+        u_sat = cv2.GaussianBlur(u_sat, self._blur_size, 0)
+        
+        _, u_sat_thresh = cv2.threshold(u_sat, OBSTACLE_SAT_THRESHOLD, 255, cv2.THRESH_BINARY)
+        
+        u_grad_x = cv2.convertScaleAbs(cv2.Scharr(u_gray, cv2.CV_16S, 1, 0))
+        u_grad_y = cv2.convertScaleAbs(cv2.Scharr(u_gray, cv2.CV_16S, 0, 1))
+        u_gradient = cv2.addWeighted(u_grad_x, 0.5, u_grad_y, 0.5, 0)
+        _, u_grad_thresh = cv2.threshold(u_gradient, self._grad_thresh, 255, cv2.THRESH_BINARY)
+        
+        return cv2.bitwise_or(u_sat_thresh, u_grad_thresh).get()
+    
+    def _find_blobs(self, mask):
+        """
+        Nettoie le masque binaire (morphologie) et retourne les composants connexes.
+        Le traitement est limité au rectangle englobant les pixels actifs:
+        sur un masque clairsemé, le coût suit la zone occupée et non l'image.
+        
+        Returns:
+            Tableau int32 (N, 5) des stats OpenCV (LEFT, TOP, WIDTH, HEIGHT, AREA)
+            de chaque composant, fond exclu, trous compris dans AREA,
+            en coordonnées du masque
+        """
+        x, y, bw, bh = cv2.boundingRect(mask)
+        if bw == 0 or bh == 0:
+            return self._no_blobs
+        
+        mh, mw = mask.shape[:2]
+        m = self._margin
+        x0, y0 = max(0, x - m), max(0, y - m)
+        x1, y1 = min(mw, x + bw + m), min(mh, y + bh + m)
+        active = mask[y0:y1, x0:x1]
+        
+        # Morphologie
+        active = cv2.morphologyEx(active, cv2.MORPH_CLOSE, self._kernel_large)
+        active = cv2.morphologyEx(active, cv2.MORPH_OPEN, self._kernel)
+        active = cv2.dilate(active, self._kernel, iterations=1)
+        
+        # Boucher les trous: l'aire d'un composant devient la surface englobée
+        # par son contour externe (comme cv2.contourArea), et non le seul
+        # nombre de pixels des bords, très faible pour un blob creux
+        outside = cv2.copyMakeBorder(active, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+        cv2.floodFill(outside, None, (0, 0), 255)
+        holes = cv2.bitwise_not(outside[1:-1, 1:-1])
+        active = cv2.bitwise_or(active, holes, dst=active)
+        
+        _, _, stats, _ = cv2.connectedComponentsWithStats(active, connectivity=8, ltype=cv2.CV_32S)
+        stats = stats[1:]
+        stats[:, cv2.CC_STAT_LEFT] += x0
+        stats[:, cv2.CC_STAT_TOP] += y0
+        return stats
+    
+    def _build_overlay(self, h, w):
+        """
+        Calcule une seule fois la géométrie des éléments fixes de l'affichage
+        (zone ROI, lignes G/C/D, labels) pour une frame de taille (h, w).
+        """
+        self._overlay_size = (h, w)
+        
+        y1 = int(h * self.roi_top)
+        y2 = int(h * self.roi_bottom)
+        third_w = w // 3
+        
+        self._overlay_roi = ((0, y1), (w-1, y2))
+        self._overlay_lines = (
+            ((third_w, y1), (third_w, y2)),
+            ((2*third_w, y1), (2*third_w, y2)),
+        )
+        self._overlay_labels = (
+            ("G", (third_w//2 - 5, y1 + 12)),
+            ("C", (w//2 - 5, y1 + 12)),
+            ("D", (2*third_w + third_w//2 - 5, y1 + 12)),
+        )
+        self._overlay_danger_box = ((w-60, 5), (w-5, 28))
+        self._overlay_danger_org = (w-55, 22)
+    
     def draw(self, frame, obstacles, danger, position):
         """Dessine les obstacles et informations sur la frame"""
         if frame is None:
             return frame
         
         h, w = frame.shape[:2]
-        y1 = int(h * self.roi_top)
-        y2 = int(h * self.roi_bottom)
+        if self._overlay_size != (h, w):
+            self._build_overlay(h, w)
         
         # Zone ROI
-        cv2.rectangle(frame, (0, y1), (w-1, y2), (60, 60, 60), 1)
+        cv2.rectangle(frame, *self._overlay_roi, (60, 60, 60), 1)
         
         # Lignes de séparation G/C/D
-        third_w = w // 3
-        cv2.line(frame, (third_w, y1), (third_w, y2), (40, 40, 40), 1)
-        cv2.line(frame, (2*third_w, y1), (2*third_w, y2), (40, 40, 40), 1)
+        for p1, p2 in self._overlay_lines:
+            cv2.line(frame, p1, p2, (40, 40, 40), 1)
         
         # Labels zones
-        cv2.putText(frame, "G", (third_w//2 - 5, y1 + 12), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.3, (80, 80, 80), 1)
-        cv2.putText(frame, "C", (w//2 - 5, y1 + 12), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.3, (80, 80, 80), 1)
-        cv2.putText(frame, "D", (2*third_w + third_w//2 - 5, y1 + 12), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.3, (80, 80, 80), 1)
-        
-        # Couleurs selon danger
-        colors = {
-            "OK": (0, 255, 0),
-            "OBS": (0, 220, 220),
-            "WARN": (0, 140, 255),
-            "STOP": (0, 0, 255)
-        }
-        color = colors.get(danger, (128, 128, 128))
+        for text, org in self._overlay_labels:
+            cv2.putText(frame, text, org, 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.3, (80, 80, 80), 1)
+        
+        # Couleur selon danger
+        color = DANGER_COLORS.get(danger, (128, 128, 128))
         
         # Dessiner obstacles
         for o in obstacles:
@@ -210,8 +346,8 @@ class ObstacleDetector:
                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
         
         # Indicateur danger
-        cv2.rectangle(frame, (w-60, 5), (w-5, 28), color, -1)
-        cv2.putText(frame, danger, (w-55, 22),
+        cv2.rectangle(frame, *self._overlay_danger_box, color, -1)
+        cv2.putText(frame, danger, self._overlay_danger_org,
                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
         
         return frame
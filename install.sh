@@ -54,7 +54,7 @@ sudo apt-get install -y -qq python3-opencv libopencv-dev
 sudo apt-get install -y -qq libusb-1.0-0-dev
 
 # Caméra Raspberry Pi
-sudo apt-get install -y -qq libcamera-apps rpicam-apps
+sudo apt-get install -y -qq libcamera-apps rpicam-apps python3-picamera2
 
 step "Dépendances système installées"
 
@@ -83,6 +83,19 @@ else
     step "Règle udev Dynamixel déjà présente"
 fi
 
+# Latency timer FTDI à 1 ms (16 ms par défaut): réponses des moteurs reçues sans attente
+LATENCY_RULE='ACTION=="add", SUBSYSTEM=="usb-serial", DRIVER=="ftdi_sio", ATTR{latency_timer}="1"'
+LATENCY_FILE="/etc/udev/rules.d/99-dynamixel-latency.rules"
+
+if [ ! -f "$LATENCY_FILE" ]; then
+    echo "$LATENCY_RULE" | sudo tee $LATENCY_FILE > /dev/null
+    sudo udevadm control --reload-rules
+    sudo udevadm trigger
+    step "Latency timer USB réglé à 1 ms"
+else
+    step "Règle latency timer déjà présente"
+fi
+
 step "Port série configuré"
 
 # ============================================================================
@@ -16,7 +16,7 @@ DETECTION_CONFIG = {
     'min_area': 800,           # Aire minimale des obstacles (pixels²)
     'roi_top': 0.3,            # Début de la zone d'intérêt (% de hauteur)
     'roi_bottom': 0.9,         # Fin de la zone d'intérêt (% de hauteur)
-    'edge_thresh': 50,         # Seuil pour détection de contours Canny
+    'edge_thresh': 50,         # Seuil pour détection de contours (gradient)
 }
 
 # Paramètres de sauvegarde
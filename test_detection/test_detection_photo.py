@@ -8,7 +8,10 @@ import os
 import sys
 import cv2
 import time
+import queue
 import logging
+import threading
+import numpy as np
 from datetime import datetime
 
 # Ajouter le dossier parent au path pour importer les modules hexapod
@@ -55,6 +58,20 @@ class AdvancedPhotoDetectionTester:
         self.detector = None
         self.keyboard = None
         
+        # Tracés fixes de draw_obstacles_advanced, calculés par taille d'image
+        self._static_size = None
+        
+        # Largeur des lignes d'information (textes en nombre limité)
+        self._info_widths = {}
+        
+        # Horodatage affiché, reformaté au plus une fois par seconde
+        self._ts_second = None
+        self._ts_text = ""
+        
+        # Écriture des JPEG en tâche de fond (voir _writer_loop)
+        self.write_queue = queue.Queue(maxsize=4)
+        self.writer_thread = None
+        
         # Créer le dossier de sauvegarde
         photos_dir = self.save_config['photos_dir']
         if not os.path.exists(photos_dir):
@@ -82,6 +99,9 @@ class AdvancedPhotoDetectionTester:
             logger.info("Initialisation du gestionnaire clavier...")
             self.keyboard = KeyboardHandler()
             
+            self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self.writer_thread.start()
+            
             # Attendre que la caméra soit prête
             time.sleep(2)
             logger.info("Système prêt!")
@@ -91,6 +111,33 @@ class AdvancedPhotoDetectionTester:
             logger.error(f"Erreur d'initialisation: {e}")
             return False
     
+    def _writer_loop(self):
+        """Thread d'écriture: encode et sauvegarde les images mises en file"""
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                break
+            filepath, image, label = item
+            try:
+                if cv2.imwrite(filepath, image, [cv2.IMWRITE_JPEG_QUALITY, self.save_config['jpeg_quality']]):
+                    logger.info(f"{label} sauvegardée: {filepath}")
+                else:
+                    logger.error(f"Impossible de sauvegarder: {filepath}")
+            except Exception as e:
+                logger.error(f"Erreur d'écriture {filepath}: {e}")
+    
+    def _save_async(self, filepath, image, label):
+        """
+        Met une image en file d'écriture sans bloquer la détection.
+        L'image ne doit plus être modifiée ensuite (pas de copie ici).
+        """
+        try:
+            self.write_queue.put_nowait((filepath, image, label))
+            return True
+        except queue.Full:
+            logger.warning(f"File d'écriture pleine, image ignorée: {filepath}")
+            return False
+    
     def take_photo_with_detection(self):
         """Prend une photo et détecte les obstacles avec configuration avancée"""
         try:
@@ -107,8 +154,8 @@ class AdvancedPhotoDetectionTester:
             if self.save_config['save_original']:
                 original_filename = f"original_{timestamp}.jpg"
                 original_filepath = os.path.join(self.save_config['photos_dir'], original_filename)
-                cv2.imwrite(original_filepath, frame, [cv2.IMWRITE_JPEG_QUALITY, self.save_config['jpeg_quality']])
-                logger.info(f"Image originale sauvegardée: {original_filepath}")
+                # Frame caméra en lecture seule: peut être écrite sans copie
+                self._save_async(original_filepath, frame, "Image originale")
             
             # Détecter les obstacles
             obstacles, danger, position = self.detector.detect(frame)
@@ -121,16 +168,10 @@ class AdvancedPhotoDetectionTester:
             detected_filename = f"obstacle_detection_{timestamp}.jpg"
             detected_filepath = os.path.join(self.save_config['photos_dir'], detected_filename)
             
-            success = cv2.imwrite(detected_filepath, annotated_frame, 
-                                [cv2.IMWRITE_JPEG_QUALITY, self.save_config['jpeg_quality']])
-            
-            if success:
-                logger.info(f"Photo avec détection sauvegardée: {detected_filepath}")
-                self.log_detection_results(obstacles, danger, position)
-            else:
-                logger.error(f"Impossible de sauvegarder: {detected_filepath}")
+            if not self._save_async(detected_filepath, annotated_frame, "Photo avec détection"):
                 return False
-                
+            
+            self.log_detection_results(obstacles, danger, position)
             return True
             
         except Exception as e:
@@ -158,6 +199,35 @@ class AdvancedPhotoDetectionTester:
                           f"Bbox=({x},{y},{w},{h})")
         logger.info("=" * 30)
     
+    def _build_static_layout(self, h, w):
+        """Calcule une fois les lignes et labels fixes (ROI, tiers) pour une image (h, w)"""
+        display = self.display_config
+        roi_top = int(h * self.detection_config['roi_top'])
+        roi_bottom = int(h * self.detection_config['roi_bottom'])
+        third_w = w // 3
+        
+        lines = []
+        labels = []
+        
+        # Zones ROI si activé
+        if display.get('show_roi_lines', True):
+            lines += [((0, roi_top), (w, roi_top)), ((0, roi_bottom), (w, roi_bottom))]
+            labels += [("ROI START", (w - 100, roi_top - 5), 0.4, 1),
+                       ("ROI END", (w - 80, roi_bottom + 15), 0.4, 1)]
+        
+        # Divisions tiers si activé
+        if display.get('show_thirds', True):
+            lines += [((third_w, roi_top), (third_w, roi_bottom)),
+                      ((2 * third_w, roi_top), (2 * third_w, roi_bottom))]
+            labels += [("G", (third_w//2 - 10, roi_top + 20), 0.6, 2),
+                       ("C", (third_w + (third_w//2) - 10, roi_top + 20), 0.6, 2),
+                       ("D", (2*third_w + (third_w//2) - 10, roi_top + 20), 0.6, 2)]
+        
+        self._static_size = (h, w)
+        self._static_color = self.colors.get('roi_lines', (255, 255, 0))
+        self._static_lines = [np.array(line, dtype=np.int32) for line in lines]
+        self._static_labels = labels
+    
     def draw_obstacles_advanced(self, frame, obstacles, danger, position):
         """Version avancée du dessin avec configuration personnalisée"""
         h, w = frame.shape[:2]
@@ -182,73 +252,64 @@ class AdvancedPhotoDetectionTester:
         # Affichage du texte avec fond
         y_offset = 25
         for line in info_lines:
-            text_size = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
+            text_w = self._info_widths.get(line)
+            if text_w is None:
+                text_w = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0][0]
+                self._info_widths[line] = text_w
             # Fond du texte
-            cv2.rectangle(frame, (8, y_offset - 20), (15 + text_size[0], y_offset + 5), 
+            cv2.rectangle(frame, (8, y_offset - 20), (15 + text_w, y_offset + 5), 
                          colors['text_bg'], -1)
             # Texte
             cv2.putText(frame, line, (10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.7, danger_color, 2)
             y_offset += 30
         
-        # Dessiner les zones ROI si activé
-        if display.get('show_roi_lines', True):
-            roi_top = int(h * self.detection_config['roi_top'])
-            roi_bottom = int(h * self.detection_config['roi_bottom'])
-            roi_color = colors.get('roi_lines', (255, 255, 0))
-            
-            cv2.line(frame, (0, roi_top), (w, roi_top), roi_color, 1)
-            cv2.line(frame, (0, roi_bottom), (w, roi_bottom), roi_color, 1)
-            
-            # Labels ROI
-            cv2.putText(frame, "ROI START", (w - 100, roi_top - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, roi_color, 1)
-            cv2.putText(frame, "ROI END", (w - 80, roi_bottom + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.4, roi_color, 1)
+        # Zones ROI et divisions tiers: toutes les lignes en un seul appel
+        if self._static_size != (h, w):
+            self._build_static_layout(h, w)
+        if self._static_lines:
+            cv2.polylines(frame, self._static_lines, False, self._static_color, 1)
+        for text, org, scale, thick in self._static_labels:
+            cv2.putText(frame, text, org, cv2.FONT_HERSHEY_SIMPLEX, scale, self._static_color, thick)
         
-        # Divisions tiers si activé
-        if display.get('show_thirds', True):
-            third_w = w // 3
-            roi_top = int(h * self.detection_config['roi_top'])
-            roi_bottom = int(h * self.detection_config['roi_bottom'])
-            roi_color = colors.get('roi_lines', (255, 255, 0))
-            
-            cv2.line(frame, (third_w, roi_top), (third_w, roi_bottom), roi_color, 1)
-            cv2.line(frame, (2 * third_w, roi_top), (2 * third_w, roi_bottom), roi_color, 1)
-            
-            # Labels des zones
-            cv2.putText(frame, "G", (third_w//2 - 10, roi_top + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, roi_color, 2)
-            cv2.putText(frame, "C", (third_w + (third_w//2) - 10, roi_top + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, roi_color, 2)
-            cv2.putText(frame, "D", (2*third_w + (third_w//2) - 10, roi_top + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, roi_color, 2)
+        # Valeurs constantes de la boucle, lues une seule fois
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        position_colors = colors['position']
+        text_fg = colors['text_fg']
+        text_bg = colors['text_bg']
+        thickness = display.get('obstacle_frame_thickness', 2)
+        show_numbers = display.get('show_obstacle_numbers', True)
+        rectangle = cv2.rectangle
+        put_text = cv2.putText
         
         # Dessiner chaque obstacle
-        for i, obs in enumerate(obstacles):
+        for i, obs in enumerate(obstacles, 1):
             x, y, w_obs, h_obs = obs['bbox']
             pos = obs['pos']
-            dist = obs['dist']
-            size = obs['size']
-            area = w_obs * h_obs
             
             # Couleur selon la position
-            color = colors['position'].get(pos, colors['text_fg'])
-            thickness = display.get('obstacle_frame_thickness', 2)
+            color = position_colors.get(pos, text_fg)
             
             # Rectangle autour de l'obstacle
-            cv2.rectangle(frame, (x, y), (x + w_obs, y + h_obs), color, thickness)
+            rectangle(frame, (x, y), (x + w_obs, y + h_obs), color, thickness)
             
             # Labels détaillés
-            label = f"{pos}:{size}:D{dist:.2f}:A{area}"
-            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
+            label = f"{pos}:{obs['size']}:D{obs['dist']:.2f}:A{w_obs * h_obs}"
+            label_w = cv2.getTextSize(label, font, 0.5, 1)[0][0]
             
             # Fond pour le texte
-            cv2.rectangle(frame, (x, y - 22), (x + label_size[0] + 4, y), color, -1)
-            cv2.putText(frame, label, (x + 2, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, colors['text_bg'], 1)
+            rectangle(frame, (x, y - 22), (x + label_w + 4, y), color, -1)
+            put_text(frame, label, (x + 2, y - 5), font, 0.5, text_bg, 1)
             
             # Numéro de l'obstacle si activé
-            if display.get('show_obstacle_numbers', True):
-                cv2.putText(frame, str(i + 1), (x + w_obs - 20, y + 20), 
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+            if show_numbers:
+                put_text(frame, str(i), (x + w_obs - 20, y + 20), font, 0.6, color, 2)
         
         # Timestamp dans le coin
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cv2.putText(frame, timestamp, (10, h - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.4, colors['text_fg'], 1)
+        now = time.time()
+        if int(now) != self._ts_second:
+            self._ts_second = int(now)
+            self._ts_text = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        put_text(frame, self._ts_text, (10, h - 10), font, 0.4, text_fg, 1)
     
     def show_config_info(self):
         """Affiche les informations de configuration"""
@@ -335,6 +396,11 @@ class AdvancedPhotoDetectionTester:
     def cleanup(self):
         """Nettoie les ressources"""
         try:
+            # Terminer les écritures en attente
+            if self.writer_thread:
+                self.write_queue.put(None)
+                self.writer_thread.join(timeout=5)
+            
             if self.camera:
                 self.camera.stop()
                 logger.info("Caméra arrêtée")